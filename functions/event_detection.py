@@ -0,0 +1,251 @@
+import io
+import os
+import re
+import argparse
+
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from google.cloud import firestore
+
+from indexer import (
+    EVENTS_COLLECTION,
+    EVENTS_STATE_DOCUMENT,
+    FILES_BY_DAY_COLLECTION,
+    INDEX_STATE_COLLECTION,
+    commit_in_batches,
+)
+
+
+BUCKET = "craam-files-bucket"
+BASELINE_MINUTES = 60
+ANOMALY_THRESHOLD = 5.0
+MIN_EVENT_MINUTES = 3
+MAD_SCALE = 1.4826  # median absolute deviation to standard deviation, for normal noise
+DETECT_WORKERS = os.cpu_count() or 1
+
+# S3 client of each worker process, created by worker_init
+s3 = None
+
+
+def worker_init():
+    global s3
+    import boto3
+
+    s3 = boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+
+
+def as_utc(value):
+    value = pd.Timestamp(value)
+    value = value.tz_convert("UTC") if value.tzinfo else value.tz_localize("UTC")
+    return value.to_pydatetime()
+
+
+def file_series(item, source):
+    # 60 s averaged amplitude/phase columns of one file, decoded as the graphs do
+    if item["extension"] == "fits":
+        from astropy.io import fits
+        from plot_savnet import savnet_frame
+
+        with fits.open(source, memmap=True) as fx:
+            df, header, _ = savnet_frame(fx)
+        return df[[name for name in header if "Amp" in name or "Phase" in name]]
+
+    from plot_awesome import awesome_narrowband_frame, load_awesome
+
+    df = awesome_narrowband_frame(load_awesome(source), item["fileName"])
+    if df is None:
+        return None
+    return df.resample("60 s").mean()
+
+
+def detect_anomalies(
+    df,
+    baseline_minutes=BASELINE_MINUTES,
+    threshold=ANOMALY_THRESHOLD,
+    min_minutes=MIN_EVENT_MINUTES,
+):
+    """Find sudden excursions from a trailing rolling baseline in every column of ``df``.
+
+    Each sample is scored against the median and median absolute deviation
+    of the preceding ``baseline_minutes``; runs of at least ``min_minutes``
+    samples scoring above ``threshold`` become one event.
+    """
+    min_periods = max(baseline_minutes // 2, 1)
+    baseline = df.shift(1).rolling(baseline_minutes, min_periods=min_periods).median()
+    residual = df - baseline
+    spread = residual.abs().shift(1).rolling(baseline_minutes, min_periods=min_periods).median()
+    score = residual / (spread * MAD_SCALE).replace(0, np.nan)
+    flags = score.abs() > threshold
+
+    events = []
+    for position, column in enumerate(df.columns):
+        flagged = flags.iloc[:, position].to_numpy(dtype=np.int8)
+        edges = np.diff(np.concatenate(([0], flagged, [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        keep = ends - starts >= min_minutes
+
+        column_score = score.iloc[:, position].to_numpy()
+        for begin, end in zip(starts[keep], ends[keep]):
+            peak = begin + int(np.nanargmax(np.abs(column_score[begin:end])))
+            events.append(
+                {
+                    "signal": str(column),
+                    "kind": "phase" if "phase" in str(column).lower() else "amplitude",
+                    "start": as_utc(df.index[begin]),
+                    "end": as_utc(df.index[end - 1]),
+                    "minutes": int(end - begin),
+                    "peakTime": as_utc(df.index[peak]),
+                    "peakScore": float(column_score[peak]),
+                    "peakDelta": float(residual.iat[peak, position]),
+                    "baseline": float(baseline.iat[peak, position]),
+                }
+            )
+    return events
+
+
+def load_file(item):
+    source = io.BytesIO()
+    try:
+        s3.download_fileobj(Bucket=BUCKET, Key=item["path"], Fileobj=source)
+        source.seek(0)
+        return file_series(item, source)
+    except Exception as exc:
+        print(f"event_detection skipped {item['path']}: {exc}")
+        return None
+
+
+def series_key(item):
+    # Files continuing the same series: one transmitter, channel and type for AWESOME,
+    # every transmitter of the station in each SAVNET file
+    if item["extension"] == "mat":
+        return item["extension"], item["fileName"][14:22]
+    return (item["extension"],)
+
+
+def detect_series(parts, baseline_minutes=BASELINE_MINUTES):
+    """Score the ``(item, series)`` files of one signal as a single series.
+
+    Consecutive files are joined so each file's baseline starts from the end
+    of the previous one; the series only restarts across gaps longer than
+    ``baseline_minutes``. Events keep the metadata of the file they start in.
+    """
+    parts = sorted(parts, key=lambda part: part[1].index[0])
+    starts = [as_utc(series.index[0]) for _, series in parts]
+
+    joined = pd.concat([series for _, series in parts]).sort_index()
+    joined = joined[~joined.index.duplicated(keep="last")]
+    gaps = np.flatnonzero(joined.index.to_series().diff() > pd.Timedelta(minutes=baseline_minutes))
+    bounds = [0, *gaps, len(joined)]
+
+    events = []
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        for event in detect_anomalies(joined.iloc[begin:end], baseline_minutes=baseline_minutes):
+            event.update(parts[bisect_right(starts, event["start"]) - 1][0])
+            events.append(event)
+    return events
+
+
+def list_files(db, station, start_year, end_year, extension=None):
+    # Narrowband files of the station; AWESOME only has amplitude (A) and phase (B) series
+    files = []
+    for year in range(start_year, end_year + 1):
+        query = (
+            db.collection(FILES_BY_DAY_COLLECTION)
+            .where("stationId", "==", station)
+            .where("year", "==", year)
+            .where("type", "==", "narrowband")
+        )
+        if extension:
+            query = query.where("extension", "==", extension)
+
+        for doc in query.stream():
+            data = doc.to_dict()
+            for item in data.get("files", []):
+                if data.get("extension") == "mat" and item.get("typeABCDF") not in ("A", "B"):
+                    continue
+                files.append(
+                    {
+                        "stationId": station,
+                        "year": year,
+                        "date": data.get("date"),
+                        "extension": data.get("extension"),
+                        "path": item.get("path"),
+                        "fileName": item.get("fileName"),
+                        "transmitter": item.get("transmitter"),
+                    }
+                )
+    return files
+
+
+def event_id(event):
+    raw = f"{event['fileName']}_{event['signal']}_{event['start']:%H%M%S}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", raw)
+
+
+def clear_events(db, station, year, extension=None):
+    query = (
+        db.collection(EVENTS_COLLECTION)
+        .where("stationId", "==", station)
+        .where("year", "==", year)
+    )
+    if extension:
+        query = query.where("extension", "==", extension)
+
+    commit_in_batches(db, [(doc.reference, None) for doc in query.stream()])
+
+
+def run_detection(db, station, start_year, end_year, extension=None, workers=DETECT_WORKERS):
+    """Detect events in every narrowband file of ``station`` and replace its stored events."""
+    files = list_files(db, station, start_year, end_year, extension)
+
+    groups = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=worker_init) as executor:
+        for item, series in zip(files, executor.map(load_file, files, chunksize=8)):
+            if series is not None and not series.empty:
+                groups.setdefault(series_key(item), []).append((item, series))
+
+    events = []
+    for parts in groups.values():
+        events.extend(detect_series(parts))
+
+    for year in range(start_year, end_year + 1):
+        clear_events(db, station, year, extension)
+    commit_in_batches(
+        db,
+        [(db.collection(EVENTS_COLLECTION).document(event_id(event)), event) for event in events],
+    )
+    db.collection(INDEX_STATE_COLLECTION).document(EVENTS_STATE_DOCUMENT).set(
+        {"updatedAt": firestore.SERVER_TIMESTAMP}
+    )
+
+    return {"files": len(files), "events": len(events)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect amplitude and phase events")
+    parser.add_argument("--station", required=True)
+    parser.add_argument("--start-year", type=int, required=True)
+    parser.add_argument("--end-year", type=int)
+    parser.add_argument("--extension", choices=["mat", "fits"])
+    parser.add_argument("--workers", type=int, default=DETECT_WORKERS)
+    args = parser.parse_args()
+
+    client = firestore.Client(database=os.getenv("FIRESTORE_DATABASE", "open-vlf"))
+    print(
+        run_detection(
+            client,
+            args.station,
+            args.start_year,
+            args.end_year or args.start_year,
+            extension=args.extension,
+            workers=args.workers,
+        )
+    )
@@ -0,0 +1,442 @@
+import os
+import re
+import argparse
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from google.cloud import firestore
+
+
+FILES_BY_DAY_COLLECTION = "files_by_day"
+YEARS_STATIONS_COLLECTION = "years_stations"
+AVAILABLE_DATES_COLLECTION = "available_dates"
+MATRIX_COLLECTION = "matrix"
+INDEX_STATE_COLLECTION = "index_state"
+INDEX_STATE_DOCUMENT = "files"
+EVENTS_COLLECTION = "events"
+EVENTS_STATE_DOCUMENT = "events"
+ALLOWED_EXTENSIONS = {"mat", "fits"}
+ALLOWED_TYPES = {"narrowband", "broadband"}
+ENDPOINT_TYPE = "AWS S3"
+BUCKET_URL = "https://{bucket}.s3.sa-east-1.amazonaws.com/{key}"
+BATCH_SIZE = 400
+LIST_WORKERS = 16
+# Incremental runs only list observation months this far before the checkpoint;
+# objects uploaded later for older dates need a wider lookback or --full
+INCREMENTAL_LOOKBACK_DAYS = int(os.getenv("INDEX_LOOKBACK_DAYS", "31"))
+# S3 sets LastModified when an upload starts but lists the object only once it completes,
+# so each run also rebuilds days with objects modified this long before the checkpoint
+CHECKPOINT_MARGIN = timedelta(hours=int(os.getenv("INDEX_CHECKPOINT_MARGIN_HOURS", "6")))
+# Day-of-year bitsets use a leap-year calendar so 29 February always has a bit
+BITSET_YEAR = 2000
+BITSET_BYTES = 46  # 366 bits
+
+# AWESOME narrowband, e.g. B1060406134536NPM_003A.mat
+AWESOME_NARROWBAND_RE = re.compile(
+    r"^(?P<station>[A-Za-z0-9]{2})(?P<stamp>\d{12})(?P<transmitter>[A-Za-z0-9]{3})"
+    r"_\d(?P<cc>\d{2})(?P<type>[ABCDF])\.mat$"
+)
+# AWESOME broadband, e.g. B1060406134536_003.mat
+AWESOME_BROADBAND_RE = re.compile(
+    r"^(?P<station>[A-Za-z0-9]{2})(?P<stamp>\d{12})_\d(?P<cc>\d{2})\.mat$"
+)
+# Object keys: YYYY/MM/DD/<type>/<station>/<file>; SAVNET years may carry a "20" prefix
+KEY_RE = re.compile(
+    r"^(?:20)?(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/"
+    r"(?P<type>[a-z]+)/(?P<station>[A-Za-z0-9]{2,4})/(?P<file>[^/]+)$"
+)
+
+
+def parse_key(key, bucket_name):
+    # Returns the files_by_day entry for an object key, or None if it is not a data file
+    match = KEY_RE.match(key)
+    if not match:
+        return None
+
+    file_name = match.group("file")
+    extension = file_name.rsplit(".", 1)[-1].lower()
+    file_type = match.group("type")
+    if extension not in ALLOWED_EXTENSIONS or file_type not in ALLOWED_TYPES:
+        return None
+
+    try:
+        day = datetime(
+            int(match.group("year")),
+            int(match.group("month")),
+            int(match.group("day")),
+            tzinfo=timezone.utc,
+        )
+    except ValueError:
+        return None
+
+    item = {
+        "fileName": file_name,
+        "endpointType": ENDPOINT_TYPE,
+        "path": key,
+        "typeABCDF": None,
+        "stationId": match.group("station"),
+        "url": BUCKET_URL.format(bucket=bucket_name, key=key),
+        "dateTime": day,
+        "CC": None,
+        "transmitter": None,
+    }
+
+    # SAVNET names carry nothing beyond what the path already gives
+    name_match = AWESOME_NARROWBAND_RE.match(file_name) or AWESOME_BROADBAND_RE.match(
+        file_name
+    )
+    if extension == "mat" and name_match:
+        fields = name_match.groupdict()
+        try:
+            item["dateTime"] = datetime.strptime(fields["stamp"], "%y%m%d%H%M%S").replace(
+                tzinfo=timezone.utc
+            )
+        except ValueError:
+            pass
+        item["CC"] = fields["cc"]
+        item["transmitter"] = fields.get("transmitter")
+        item["typeABCDF"] = fields.get("type")
+
+    return {
+        "date": day.strftime("%Y-%m-%d"),
+        "year": day.year,
+        "month": day.month,
+        "day": day.day,
+        "stationId": item["stationId"],
+        "type": file_type,
+        "extension": extension,
+        "item": item,
+    }
+
+
+def list_prefix(s3, bucket_name, prefix):
+    paginator = s3.get_paginator("list_objects_v2")
+    objects = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for entry in page.get("Contents", []):
+            objects.append((entry["Key"], entry["LastModified"]))
+    return objects
+
+
+def list_year_prefixes(s3, bucket_name):
+    paginator = s3.get_paginator("list_objects_v2")
+    prefixes = []
+    for page in paginator.paginate(Bucket=bucket_name, Delimiter="/"):
+        for entry in page.get("CommonPrefixes", []):
+            prefix = entry["Prefix"]
+            if re.match(r"^(?:20)?\d{4}/$", prefix):
+                prefixes.append(prefix)
+    return prefixes
+
+
+def month_prefixes(year_prefixes, since=None):
+    # One shard per year/month; with ``since`` only months from then onwards
+    shards = []
+    for year_prefix in year_prefixes:
+        year = int(year_prefix[-5:-1])
+        for month in range(1, 13):
+            if since and (year, month) < (since.year, since.month):
+                continue
+            shards.append(f"{year_prefix}{month:02d}/")
+    return shards
+
+
+def list_objects(s3, bucket_name, prefixes, workers=LIST_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda prefix: list_prefix(s3, bucket_name, prefix), prefixes)
+        return [entry for objects in results for entry in objects]
+
+
+def group_files(entries):
+    # files_by_day documents keyed by their document id
+    groups = {}
+    for entry in entries:
+        doc_id = f"{entry['date']}_{entry['stationId']}_{entry['type']}_{entry['extension']}"
+        if doc_id not in groups:
+            groups[doc_id] = {
+                "date": entry["date"],
+                "year": entry["year"],
+                "stationId": entry["stationId"],
+                "type": entry["type"],
+                "extension": entry["extension"],
+                "files": [],
+            }
+        groups[doc_id]["files"].append(entry["item"])
+
+    for group in groups.values():
+        group["files"].sort(key=lambda item: (item["dateTime"], item["fileName"]))
+        group["fileCount"] = len(group["files"])
+    return groups
+
+
+def summarize(groups):
+    # Derive available_dates, years_stations and matrix contents from day groups
+    available_dates = {}
+    years_stations = {}
+    matrix = {}
+
+    for group in groups.values():
+        year = group["year"]
+        station = group["stationId"]
+        extension = group["extension"]
+        _, month, day = (int(part) for part in group["date"].split("-"))
+
+        dates_id = f"{station}_{year}_{extension}"
+        if dates_id not in available_dates:
+            available_dates[dates_id] = {
+                "stationId": station,
+                "year": year,
+                "extension": extension,
+                "narrowband": set(),
+                "broadband": set(),
+            }
+        available_dates[dates_id][group["type"]].add((month, day))
+
+        years_id = f"{extension}_{year}"
+        years_stations.setdefault(years_id, {"year": year, "extension": extension, "stations": set()})
+        years_stations[years_id]["stations"].add(station)
+
+        dates = matrix.setdefault(years_id, {})
+        if group["date"] not in dates:
+            dates[group["date"]] = {"stations": set(), "count": 0}
+        dates[group["date"]]["stations"].add(station)
+        dates[group["date"]]["count"] += group["fileCount"]
+
+    return available_dates, years_stations, matrix
+
+
+def day_index(month, day):
+    return (date(BITSET_YEAR, month, day) - date(BITSET_YEAR, 1, 1)).days
+
+
+def days_to_bits(days):
+    bits = 0
+    for month, day in days:
+        try:
+            bits |= 1 << day_index(month, day)
+        except (TypeError, ValueError):
+            continue
+    return bits
+
+
+def bits_to_days(bits):
+    first = date(BITSET_YEAR, 1, 1)
+    days = []
+    while bits:
+        lowest = bits & -bits
+        current = first + timedelta(days=lowest.bit_length() - 1)
+        days.append((current.month, current.day))
+        bits ^= lowest
+    return days
+
+
+def bits_to_bytes(bits):
+    return bits.to_bytes(BITSET_BYTES, "little")
+
+
+def bits_from_bytes(value):
+    return int.from_bytes(value, "little")
+
+
+def days_list(days):
+    return [{"month": month, "day": day} for month, day in sorted(days)]
+
+
+def matrix_items(dates):
+    return [
+        {"date": day_str, "stations": sorted(values["stations"]), "count": values["count"]}
+        for day_str, values in sorted(dates.items())
+    ]
+
+
+def commit_in_batches(db, writes):
+    # writes are (reference, data) pairs; data of None deletes the document
+    batch = db.batch()
+    pending = 0
+    for ref, data in writes:
+        if data is None:
+            batch.delete(ref)
+        else:
+            batch.set(ref, data)
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+
+def merge_existing(db, available_dates, years_stations, matrix):
+    # Fold documents already in Firestore into the summaries of an incremental run
+    for doc_id, summary in available_dates.items():
+        doc = db.collection(AVAILABLE_DATES_COLLECTION).document(doc_id).get()
+        if doc.exists:
+            data = doc.to_dict()
+            for field in ALLOWED_TYPES:
+                summary[field].update(
+                    (item.get("month"), item.get("day")) for item in data.get(field, [])
+                )
+
+    for doc_id, summary in years_stations.items():
+        doc = db.collection(YEARS_STATIONS_COLLECTION).document(doc_id).get()
+        if doc.exists:
+            summary["stations"].update(doc.to_dict().get("stations", []))
+
+    for doc_id, dates in matrix.items():
+        doc = db.collection(MATRIX_COLLECTION).document(doc_id).get()
+        if doc.exists:
+            for item in doc.to_dict().get("items", []):
+                if item.get("date") not in dates:
+                    dates[item.get("date")] = {
+                        "stations": set(item.get("stations", [])),
+                        "count": item.get("count", 0),
+                    }
+
+
+def write_index(db, groups, available_dates, years_stations, matrix):
+    writes = []
+    for doc_id, group in groups.items():
+        writes.append((db.collection(FILES_BY_DAY_COLLECTION).document(doc_id), group))
+
+    for doc_id, summary in available_dates.items():
+        data = dict(summary)
+        for field in ALLOWED_TYPES:
+            data[field] = days_list(summary[field])
+            data[f"{field}Bits"] = bits_to_bytes(days_to_bits(summary[field]))
+        writes.append((db.collection(AVAILABLE_DATES_COLLECTION).document(doc_id), data))
+
+    for doc_id, summary in years_stations.items():
+        data = dict(summary, stations=sorted(summary["stations"]))
+        writes.append((db.collection(YEARS_STATIONS_COLLECTION).document(doc_id), data))
+
+    for doc_id, dates in matrix.items():
+        extension, year = doc_id.split("_")
+        data = {"extension": extension, "year": int(year), "items": matrix_items(dates)}
+        writes.append((db.collection(MATRIX_COLLECTION).document(doc_id), data))
+
+    commit_in_batches(db, writes)
+
+
+def changed_groups(objects, bucket_name, checkpoint=None, margin=CHECKPOINT_MARGIN):
+    # files_by_day groups to rewrite: all of them without a checkpoint, otherwise the
+    # days holding an object modified after checkpoint - margin
+    threshold = checkpoint - margin if checkpoint is not None else None
+    entries = []
+    changed_days = set()
+    for key, last_modified in objects:
+        entry = parse_key(key, bucket_name)
+        if entry is None:
+            continue
+        entries.append(entry)
+        if threshold is None or last_modified > threshold:
+            changed_days.add((entry["date"], entry["extension"]))
+
+    groups = group_files(entries)
+    if threshold is None:
+        return groups
+    # Whole days are rebuilt so every station of a changed date keeps its matrix count
+    return {
+        doc_id: group
+        for doc_id, group in groups.items()
+        if (group["date"], group["extension"]) in changed_days
+    }
+
+
+def build_index(
+    db,
+    s3,
+    bucket_name,
+    full=False,
+    workers=LIST_WORKERS,
+    lookback_days=INCREMENTAL_LOOKBACK_DAYS,
+    require_checkpoint=False,
+):
+    """Index the bucket into Firestore; incremental unless ``full`` or no checkpoint exists.
+
+    Incremental runs list the observation months from ``lookback_days``
+    before the last checkpoint onwards (every month when it is 0) and
+    rewrite the day documents that gained or changed objects since then.
+    Objects uploaded after the checkpoint for older observation dates are
+    only picked up with a wider lookback or a full run.
+
+    The checkpoint is the start time of the last run that wrote changes, and
+    days with objects modified up to ``CHECKPOINT_MARGIN`` before it are
+    rebuilt again, so uploads still in progress during a listing are not lost.
+
+    With ``require_checkpoint`` nothing is done until a full run has seeded
+    the checkpoint.
+    """
+    started = datetime.now(timezone.utc)
+    state_ref = db.collection(INDEX_STATE_COLLECTION).document(INDEX_STATE_DOCUMENT)
+    checkpoint = None
+    if not full:
+        state = state_ref.get()
+        if state.exists:
+            checkpoint = state.to_dict().get("lastModified")
+
+    if checkpoint is None and require_checkpoint:
+        return {"objects": 0, "days": 0, "skipped": "no checkpoint, run indexer.py --full"}
+
+    since = None
+    if checkpoint and lookback_days:
+        since = checkpoint - timedelta(days=lookback_days)
+
+    prefixes = month_prefixes(list_year_prefixes(s3, bucket_name), since)
+    objects = list_objects(s3, bucket_name, prefixes, workers)
+    if not objects:
+        return {"objects": 0, "days": 0}
+
+    groups = changed_groups(objects, bucket_name, checkpoint)
+    if not groups:
+        return {"objects": len(objects), "days": 0}
+
+    available_dates, years_stations, matrix = summarize(groups)
+    if checkpoint is not None:
+        merge_existing(db, available_dates, years_stations, matrix)
+
+    write_index(db, groups, available_dates, years_stations, matrix)
+    state_ref.set(
+        {
+            "lastModified": started,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+            "full": checkpoint is None,
+        }
+    )
+
+    return {"objects": len(objects), "days": len(groups)}
+
+
+if __name__ == "__main__":
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Index craam-files-bucket into Firestore")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and rescan")
+    parser.add_argument("--workers", type=int, default=LIST_WORKERS)
+    parser.add_argument(
+        "--lookback-days",
+        type=int,
+        default=INCREMENTAL_LOOKBACK_DAYS,
+        help="incremental runs only list observation months this many days before the "
+        "checkpoint, so late uploads for older dates are missed; 0 lists every month",
+    )
+    parser.add_argument("--bucket", default="craam-files-bucket")
+    args = parser.parse_args()
+
+    client = firestore.Client(database=os.getenv("FIRESTORE_DATABASE", "open-vlf"))
+    s3_client = boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+    print(
+        build_index(
+            client,
+            s3_client,
+            args.bucket,
+            full=args.full,
+            workers=args.workers,
+            lookback_days=args.lookback_days,
+        )
+    )
@@ -1,18 +1,40 @@
 import base64
+import gzip
+import hashlib
 import io
+import json
 import os
 import boto3
 import re
+import tempfile
+import threading
+import time
 from urllib.parse import urlparse
 from botocore.exceptions import ClientError
 
 from datetime import datetime, timezone
 
-from firebase_functions import https_fn, options
+from firebase_functions import https_fn, options, scheduler_fn
 from firebase_admin import initialize_app, auth, app_check
 from google.auth import default as google_auth_default
 from google.cloud import firestore
-from flask import jsonify
+from flask import jsonify, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from indexer import (
+    build_index,
+    bits_from_bytes,
+    bits_to_days,
+    days_to_bits,
+    EVENTS_COLLECTION,
+    EVENTS_STATE_DOCUMENT,
+    INDEX_STATE_COLLECTION,
+    INDEX_STATE_DOCUMENT,
+)
 
 
 initialize_app()
@@ -29,12 +51,78 @@ FILES_BY_DAY_COLLECTION = "files_by_day"
 YEARS_STATIONS_COLLECTION = "years_stations"
 AVAILABLE_DATES_COLLECTION = "available_dates"
 MATRIX_COLLECTION = "matrix"
+ALLOWED_EVENT_KINDS = {"amplitude", "phase"}
+ALLOWED_COVERAGE_MODES = {"all", "any"}
 ALLOWED_EXTENSIONS = {"mat", "fits"}
 ALLOWED_TYPES = {"narrowband", "broadband"}
+ALLOWED_FORMATS = {"json", "compact"}
 STATION_RE = re.compile(r"^[A-Za-z0-9]{2,4}$")
 MIN_YEAR = 2006
 MAX_YEAR = 2026
 DEFAULT_CACHE_SECONDS = 600
+COMPRESS_MIN_BYTES = 1024
+IMAGE_FORMATS = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+LOSSY_IMAGE_FORMATS = {"webp", "jpeg"}
+# Figure sizes are in inches, as in matplotlib; None keeps each plot's own size
+RENDER_PRESETS = {
+    "default": {
+        "width": None,
+        "height": None,
+        "dpi": 100,
+        "format": "png",
+        "quality": 90,
+        "decorations": True,
+    },
+    # Day-overview tiles: no legends, titles or minor ticks
+    "thumbnail": {
+        "width": 4,
+        "height": 2.5,
+        "dpi": 72,
+        "format": "webp",
+        "quality": 75,
+        "decorations": False,
+    },
+}
+MAX_FIGURE_INCHES = 20
+# Objects larger than this are downloaded to a temp file in SPILL_DIR and memory-mapped.
+# On Cloud Functions /tmp is an in-memory filesystem, so unless SPILL_DIR points at a
+# mounted volume the file still counts against the instance memory and is added to the
+# render's admission weight; spilling then only saves the extra buffer copy and keeps
+# the FITS data out of the Python heap (.mat files are still read whole).
+SPILL_THRESHOLD_BYTES = int(os.getenv("SPILL_THRESHOLD_MB", "64")) * 1024 * 1024
+SPILL_DIR = os.getenv("SPILL_DIR") or None
+# Estimated in-memory size above which a render is refused with 413
+MAX_DECODE_BYTES = int(os.getenv("MAX_DECODE_MB", "768")) * 1024 * 1024
+FITS_BLOCK_BYTES = 2880
+# Decoded arrays are copied into DataFrames and resampled while plotting
+DECODE_OVERHEAD = 3
+MAT_CLASS_BYTES = {
+    "double": 8,
+    "single": 4,
+    "int64": 8,
+    "uint64": 8,
+    "int32": 4,
+    "uint32": 4,
+    "int16": 2,
+    "uint16": 2,
+    "int8": 1,
+    "uint8": 1,
+    "logical": 1,
+    "char": 2,
+}
+MIN_DPI = 30
+MAX_DPI = 300
+GRAPH_CONCURRENCY = 8
+# Admission control for renders on one instance; coalesced requests do not count
+RENDER_MAX_INFLIGHT = int(os.getenv("RENDER_MAX_INFLIGHT", "4"))
+RENDER_MEMORY_BUDGET_BYTES = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "768")) * 1024 * 1024
+# An instance holds at most GRAPH_CONCURRENCY requests, so the queue must stay below
+# GRAPH_CONCURRENCY - RENDER_MAX_INFLIGHT for a full queue (and a fast 503) to be reachable
+RENDER_QUEUE_SIZE = int(
+    os.getenv("RENDER_QUEUE_SIZE", str(max((GRAPH_CONCURRENCY - RENDER_MAX_INFLIGHT) // 2, 1)))
+)
+RENDER_QUEUE_SECONDS = float(os.getenv("RENDER_QUEUE_SECONDS", "5"))
+RETRY_AFTER_SECONDS = 5
 
 # S3 client session
 s3 = boto3.client(
@@ -43,6 +131,149 @@ s3 = boto3.client(
     aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
 )
 bucket: str = "craam-files-bucket"
+BUCKET_URL_PREFIX = f"https://{bucket}.s3.sa-east-1.amazonaws.com/"
+
+# Matplotlib's pyplot state is global, so concurrent requests on one instance
+# must not draw at the same time.
+plot_lock = threading.Lock()
+
+# Renders currently running on this instance, keyed by S3 key and options
+inflight_renders = {}
+inflight_lock = threading.Lock()
+render_metrics = {"renders": 0, "coalesced": 0}
+
+
+class InflightRender:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+        self.waiters = 0
+
+
+class AdmissionController:
+    """Bounds the renders running on this instance by count and estimated memory.
+
+    Requests that cannot start wait in a short queue until ``wait_seconds``
+    pass; when the queue is full or the wait times out they are shed.
+    """
+
+    def __init__(self, max_inflight, memory_budget, queue_size, wait_seconds):
+        self.max_inflight = max_inflight
+        self.memory_budget = memory_budget
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        self.condition = threading.Condition()
+        self.inflight = 0
+        self.memory = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def can_admit(self, weight):
+        if self.inflight >= self.max_inflight:
+            return False
+        # A request heavier than the whole budget still runs once the instance is idle
+        return self.inflight == 0 or self.memory + weight <= self.memory_budget
+
+    def acquire(self, weight):
+        # Seconds spent queued (0 when admitted at once), or None when shed
+        started = time.monotonic()
+        deadline = started + self.wait_seconds
+        waited = 0.0
+        with self.condition:
+            if not self.can_admit(weight):
+                if self.queued >= self.queue_size:
+                    self.shed += 1
+                    return None
+                self.queued += 1
+                try:
+                    while not self.can_admit(weight):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.shed += 1
+                            return None
+                        self.condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+                waited = time.monotonic() - started
+
+            self.inflight += 1
+            self.memory += weight
+            self.admitted += 1
+            return waited
+
+    def release(self, weight):
+        with self.condition:
+            self.inflight -= 1
+            self.memory -= weight
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                "inflight": self.inflight,
+                "memoryBytes": self.memory,
+                "queueDepth": self.queued,
+                "admitted": self.admitted,
+                "shed": self.shed,
+            }
+
+
+admission = AdmissionController(
+    RENDER_MAX_INFLIGHT,
+    RENDER_MEMORY_BUDGET_BYTES,
+    RENDER_QUEUE_SIZE,
+    RENDER_QUEUE_SECONDS,
+)
+
+
+def log_metrics(event, **fields):
+    # One JSON line per event, picked up by Cloud Logging as jsonPayload
+    print(json.dumps({"event": event, **fields, **render_metrics, **admission.snapshot()}))
+
+
+def copy_response(response):
+    return https_fn.Response(
+        response=response.get_data(),
+        status=response.status_code,
+        headers=dict(response.headers),
+    )
+
+
+def coalesce_render(render_key, render):
+    """Run ``render`` once per ``render_key``; concurrent callers share the result."""
+    with inflight_lock:
+        inflight = inflight_renders.get(render_key)
+        leader = inflight is None
+        if leader:
+            inflight = InflightRender()
+            inflight_renders[render_key] = inflight
+            render_metrics["renders"] += 1
+        else:
+            inflight.waiters += 1
+            render_metrics["coalesced"] += 1
+
+    if not leader:
+        inflight.done.wait()
+        if inflight.error is not None:
+            raise inflight.error
+        return copy_response(inflight.response)
+
+    try:
+        inflight.response = render()
+    except Exception as exc:
+        inflight.error = exc
+        raise
+    finally:
+        with inflight_lock:
+            del inflight_renders[render_key]
+        inflight.done.set()
+
+    if inflight.waiters:
+        log_metrics("render_coalesced", key=render_key[0], waiters=inflight.waiters)
+    return inflight.response
+
 
 def init_plot():
     import matplotlib
@@ -63,13 +294,106 @@ def serialize_datetime(value):
     return value
 
 
-def json_response(payload, cache_seconds=DEFAULT_CACHE_SECONDS):
-    response = jsonify(payload)
+def compress_response(response):
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=5))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=6))
+    else:
+        return response
+
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def index_validator(req: https_fn.Request, document=INDEX_STATE_DOCUMENT):
+    # The indexer rewrites index_state only when the collections change, so its
+    # update_time versions every Firestore-backed response
+    doc = db.collection(INDEX_STATE_COLLECTION).document(document).get()
+    if not doc.exists or doc.update_time is None:
+        return None
+    updated = doc.update_time
+    args = "&".join(f"{key}={value}" for key, value in sorted(req.args.items(multi=True)))
+    etag = hashlib.sha1(f"{updated.isoformat()}?{req.path}?{args}".encode()).hexdigest()
+    return etag, updated.replace(microsecond=0)
+
+
+def is_not_modified(req: https_fn.Request, validator) -> bool:
+    if validator is None:
+        return False
+    etag, last_modified = validator
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+    if req.if_modified_since:
+        return req.if_modified_since >= last_modified
+    return False
+
+
+def set_validator(response, validator, cache_seconds):
     if cache_seconds:
         response.headers["Cache-Control"] = f"public, max-age={cache_seconds}"
+    if validator is not None:
+        etag, last_modified = validator
+        # Weak, since the same representation may be sent with different encodings
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
     return response
 
 
+def not_modified_response(validator, cache_seconds=DEFAULT_CACHE_SECONDS):
+    return set_validator(https_fn.Response(status=304), validator, cache_seconds)
+
+
+def json_response(payload, cache_seconds=DEFAULT_CACHE_SECONDS, validator=None):
+    response = set_validator(jsonify(payload), validator, cache_seconds)
+    return compress_response(response)
+
+
+def compact_records(records, fields):
+    # Columnar layout: fields with a single value across all records become constants
+    constants = {}
+    columns = {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if all(value == values[0] for value in values):
+            constants[field] = values[0]
+        else:
+            columns[field] = values
+    return {
+        "format": "compact",
+        "count": len(records),
+        "constants": constants,
+        "columns": columns,
+    }
+
+
+def compact_files(files):
+    # fileName and url are left out when they can be rebuilt from path:
+    # fileName = last path segment, url = constants.urlPrefix + path
+    fields = ["path", "endpointType", "typeABCDF", "stationId", "dateTime", "CC", "transmitter"]
+    derived = []
+    if all(item["path"] and item["fileName"] == item["path"].rsplit("/", 1)[-1] for item in files):
+        derived.append("fileName")
+    else:
+        fields.append("fileName")
+    if all(item["path"] and item["url"] == BUCKET_URL_PREFIX + item["path"] for item in files):
+        derived.append("url")
+    else:
+        fields.append("url")
+
+    payload = compact_records(files, fields)
+    payload["constants"]["urlPrefix"] = BUCKET_URL_PREFIX
+    payload["derived"] = derived
+    return payload
+
+
 def normalize_extension(value):
     if not value:
         return None
@@ -88,6 +412,15 @@ def normalize_type(value):
     return data_type
 
 
+def normalize_format(value):
+    if not value:
+        return "json"
+    response_format = value.lower()
+    if response_format not in ALLOWED_FORMATS:
+        return None
+    return response_format
+
+
 def parse_int(value):
     try:
         return int(value)
@@ -95,10 +428,72 @@ def parse_int(value):
         return None
 
 
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_render_options(body_data):
+    # Preset values are defaults; explicit width/height/dpi/format/quality override them
+    preset = RENDER_PRESETS.get(str(body_data.get("preset") or "default").lower())
+    if preset is None:
+        return None
+    render_options = dict(preset)
+
+    for field in ("width", "height"):
+        if body_data.get(field) is not None:
+            value = parse_float(body_data[field])
+            if value is None or not (1 <= value <= MAX_FIGURE_INCHES):
+                return None
+            render_options[field] = value
+    if (render_options["width"] is None) != (render_options["height"] is None):
+        return None
+
+    if body_data.get("dpi") is not None:
+        dpi = parse_int(body_data["dpi"])
+        if dpi is None or not (MIN_DPI <= dpi <= MAX_DPI):
+            return None
+        render_options["dpi"] = dpi
+
+    if body_data.get("format") is not None:
+        image_format = str(body_data["format"]).lower()
+        image_format = "jpeg" if image_format == "jpg" else image_format
+        if image_format not in IMAGE_FORMATS:
+            return None
+        render_options["format"] = image_format
+
+    if body_data.get("quality") is not None:
+        quality = parse_int(body_data["quality"])
+        if quality is None or not (1 <= quality <= 100):
+            return None
+        render_options["quality"] = quality
+
+    return render_options
+
+
+def figure_size(render_options):
+    if render_options["width"] is None:
+        return None
+    return render_options["width"], render_options["height"]
+
+
 def valid_station(value):
     return bool(value and STATION_RE.match(value))
 
 
+def day_bits(data, field):
+    # available_dates documents written before the bitsets only have the day lists
+    if data.get(f"{field}Bits"):
+        return bits_from_bytes(data[f"{field}Bits"])
+    return days_to_bits((item.get("month"), item.get("day")) for item in data.get(field, []))
+
+
+def days_response(bits):
+    return [{"day": day, "month": month} for month, day in bits_to_days(bits)]
+
+
 def verify_request(req: https_fn.Request) -> bool:
     if req.method == "OPTIONS":
         return True
@@ -126,76 +521,157 @@ def verify_request(req: https_fn.Request) -> bool:
     return True
 
 
-def mat_graph(object_buffer, path):
-    import h5py
-    import scipy.io as sio
-    from mat73 import HDF5Decoder
-    from plot_awesome import plot_awesome
-
-    plt = init_plot()
-    try:
-        # Handles v4 (Level 1.0), v6 and v7 to 7.2
-        data = sio.loadmat(object_buffer)
-    except ValueError:
-        # Handles v7.3
-        decoder = HDF5Decoder()
-
-        try:
-            with h5py.File(object_buffer) as hdf5:
-                data = decoder.mat2dict(hdf5)["data"]
-
-        except OSError:
-            # File is corrupted or not in HDF5 format
-            return https_fn.Response(
-                status=400, response="File is corrupted or not in HDF5 format"
-            )
-
-    filename = path.split('/')[-1]
-    fig, rc = plot_awesome(data, filename)
-
+def figure_response(plt, fig, rc, render_options):
     if rc > 0:
+        if fig is not None:
+            plt.close(fig)
         return https_fn.Response(status=400, response="Error while creating plot")
 
     # Export plot to a new buffer
+    image_format = render_options["format"]
+    save_options = {"format": image_format, "dpi": render_options["dpi"]}
+    if image_format in LOSSY_IMAGE_FORMATS:
+        save_options["pil_kwargs"] = {"quality": render_options["quality"]}
     image_buffer = io.BytesIO()
-    plt.savefig(image_buffer, format="png")
+    fig.savefig(image_buffer, **save_options)
+    plt.close(fig)
     image_buffer.seek(0)
 
     # Convert image in bytes to base64 encoded
     base64_utf8_str = base64.b64encode(image_buffer.read()).decode("utf-8")
 
     return https_fn.Response(
-        status=200, response=f"data:image/png;base64,{base64_utf8_str}"
+        status=200,
+        response=f"data:{IMAGE_FORMATS[image_format]};base64,{base64_utf8_str}",
     )
 
 
-def fits_graph(object_buffer, path):
+def rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def fits_headers_bytes(fileobj):
     from astropy.io import fits
-    from plot_savnet import plot_savnet
 
-    plt = init_plot()
+    # Reads each HDU header and seeks past its data, without opening the file
+    # through fits.open (which would close a caller's buffer)
+    fileobj.seek(0, io.SEEK_END)
+    end = fileobj.tell()
+    fileobj.seek(0)
+
+    total = 0
+    while fileobj.tell() < end:
+        header = fits.Header.fromfile(fileobj)
+        naxis = header.get("NAXIS", 0)
+        elements = 1 if naxis else 0
+        for axis in range(1, naxis + 1):
+            elements *= header.get(f"NAXIS{axis}", 0)
+        data_bytes = (
+            abs(header.get("BITPIX", 8)) // 8
+            * header.get("GCOUNT", 1)
+            * (header.get("PCOUNT", 0) + elements)
+        )
+        total += data_bytes
+        blocks = -(-data_bytes // FITS_BLOCK_BYTES)
+        fileobj.seek(blocks * FITS_BLOCK_BYTES, io.SEEK_CUR)
+    return total
+
+
+def estimate_fits_bytes(source):
+    if isinstance(source, str):
+        with open(source, "rb") as fileobj:
+            return fits_headers_bytes(fileobj)
+
     try:
-        fx = fits.open(object_buffer, memmap=True)
+        return fits_headers_bytes(source)
+    finally:
+        rewind(source)
+
+
+def estimate_mat_bytes(source):
+    import h5py
+    import scipy.io as sio
+
+    total = 0
+    try:
+        # v4 to v7.2: shapes and classes come from the variable headers
+        for _, shape, mat_class in sio.whosmat(source):
+            elements = 1
+            for size in shape:
+                elements *= size
+            total += elements * MAT_CLASS_BYTES.get(mat_class, 8)
+    except (ValueError, NotImplementedError):
+        # v7.3 is HDF5: sum the dataset shapes
+        rewind(source)
+        with h5py.File(source, "r") as hdf5:
+            datasets = []
+            hdf5.visititems(
+                lambda _, item: datasets.append(item) if isinstance(item, h5py.Dataset) else None
+            )
+            total = sum(dataset.size * dataset.dtype.itemsize for dataset in datasets)
+    rewind(source)
+    return total
+
+
+def estimate_decoded_bytes(source, path):
+    try:
+        if path.lower().endswith(".fits"):
+            return estimate_fits_bytes(source) * DECODE_OVERHEAD
+        if path.lower().endswith(".mat"):
+            return estimate_mat_bytes(source) * DECODE_OVERHEAD
+    except (OSError, ValueError, EOFError):
+        # Unreadable headers are reported by the decoders themselves
+        rewind(source)
+    return 0
+
+
+def mat_graph(object_buffer, path, render_options):
+    from plot_awesome import load_awesome, plot_awesome
+
+    try:
+        data = load_awesome(object_buffer)
     except OSError:
-        return https_fn.Response(status=400, response="Error while creating plot")
+        # File is corrupted or not in HDF5 format
+        return https_fn.Response(
+            status=400, response="File is corrupted or not in HDF5 format"
+        )
 
     filename = path.split('/')[-1]
-    fig, rc = plot_savnet(fx, filename)
+    with plot_lock:
+        # rcParams are global too, so they are only touched while holding the lock
+        plt = init_plot()
+        fig, rc = plot_awesome(
+            data,
+            filename,
+            figsize=figure_size(render_options),
+            decorations=render_options["decorations"],
+        )
+        return figure_response(plt, fig, rc, render_options)
 
-    if rc > 0:
-        return https_fn.Response(status=400, response="Error while creating plot")
 
-    # Export plot to a new buffer
-    image_buffer = io.BytesIO()
-    plt.savefig(image_buffer, format="png")
-    image_buffer.seek(0)
+def fits_graph(object_buffer, path, render_options):
+    from astropy.io import fits
+    from plot_savnet import plot_savnet
 
-    # Convert image in bytes to base64 encoded
-    base64_utf8_str = base64.b64encode(image_buffer.read()).decode("utf-8")
+    try:
+        fx = fits.open(object_buffer, memmap=True)
+    except OSError:
+        return https_fn.Response(status=400, response="Error while creating plot")
 
-    return https_fn.Response(
-        status=200, response=f"data:image/png;base64,{base64_utf8_str}"
-    )
+    filename = path.split('/')[-1]
+    try:
+        with plot_lock:
+            plt = init_plot()
+            fig, rc = plot_savnet(
+                fx,
+                filename,
+                figsize=figure_size(render_options),
+                decorations=render_options["decorations"],
+            )
+            return figure_response(plt, fig, rc, render_options)
+    finally:
+        fx.close()
 
 def normalize_s3_key(path: str, bucket_name: str) -> str:
     if path.startswith("http://") or path.startswith("https://"):
@@ -215,7 +691,12 @@ def normalize_s3_key(path: str, bucket_name: str) -> str:
     return path.lstrip("/")
 
 
-@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["post"]))
+@https_fn.on_request(
+    cors=options.CorsOptions(cors_origins="*", cors_methods=["post"]),
+    concurrency=GRAPH_CONCURRENCY,
+    cpu=1,
+    memory=options.MemoryOption.GB_1,
+)
 def graph_generator(req: https_fn.Request) -> https_fn.Response:
     if not verify_request(req):
         return https_fn.Response(status=401, response="Unauthorized")
@@ -229,48 +710,116 @@ def graph_generator(req: https_fn.Request) -> https_fn.Response:
     if not key:
         return https_fn.Response(status=400, response="Invalid path")
 
-    # Download file data with buffer
-    object_buffer = io.BytesIO()
+    render_options = parse_render_options(body_data)
+    if render_options is None:
+        return https_fn.Response(status=400, response="Invalid render options")
+
+    # Identical requests arriving while this one renders wait for its result
+    render_key = (key, tuple(sorted(render_options.items())))
+    return coalesce_render(render_key, lambda: render_graph(key, render_options))
+
+
+def object_missing(exc: ClientError) -> bool:
+    return exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+def resolve_object(key: str):
+    # HEAD the object (or its "20"-prefixed SAVNET alternative); returns (key, size) or None
     try:
-        s3.download_fileobj(Bucket=bucket, Key=key, Fileobj=object_buffer)
+        return key, s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
     except ClientError as exc:
-        error_code = exc.response.get("Error", {}).get("Code")
-        if error_code in ("404", "NoSuchKey", "NotFound"):
-            alt_key = None
-            if key.lower().endswith(".fits"):
-                year_part = key.split("/", 1)[0]
-                if year_part.isdigit() and len(year_part) == 4:
-                    alt_key = f"20{key}"
-            if alt_key:
-                try:
-                    object_buffer = io.BytesIO()
-                    s3.download_fileobj(Bucket=bucket, Key=alt_key, Fileobj=object_buffer)
-                    key = alt_key
-                except ClientError as alt_exc:
-                    alt_code = alt_exc.response.get("Error", {}).get("Code")
-                    if alt_code in ("404", "NoSuchKey", "NotFound"):
-                        print(f"graph_generator missing key: {key}")
-                        print(f"graph_generator missing alt key: {alt_key}")
-                        return https_fn.Response(status=404, response="File not found")
-                    raise
-            else:
-                print(f"graph_generator missing key: {key}")
-                return https_fn.Response(status=404, response="File not found")
-        else:
+        if not object_missing(exc):
+            raise
+
+    alt_key = None
+    if key.lower().endswith(".fits"):
+        year_part = key.split("/", 1)[0]
+        if year_part.isdigit() and len(year_part) == 4:
+            alt_key = f"20{key}"
+    if not alt_key:
+        print(f"graph_generator missing key: {key}")
+        return None
+
+    try:
+        return alt_key, s3.head_object(Bucket=bucket, Key=alt_key)["ContentLength"]
+    except ClientError as alt_exc:
+        if not object_missing(alt_exc):
             raise
+        print(f"graph_generator missing key: {key}")
+        print(f"graph_generator missing alt key: {alt_key}")
+        return None
+
+
+def too_large_response(key: str, size: int) -> https_fn.Response:
+    print(f"graph_generator over budget: {key} ({size} bytes)")
+    return https_fn.Response(status=413, response="File too large to render")
+
+
+def render_weight(size: int) -> int:
+    # Admission weight of a render: the decoded size, which is at least the object size,
+    # plus the spill file when it sits in the in-memory /tmp
+    weight = size * DECODE_OVERHEAD
+    if size > SPILL_THRESHOLD_BYTES and SPILL_DIR is None:
+        weight += size
+    return min(weight, RENDER_MEMORY_BUDGET_BYTES)
+
 
-    # Restart buffer pointer and guard against empty objects
-    object_buffer.seek(0, io.SEEK_END)
-    if object_buffer.tell() == 0:
+def render_graph(key: str, render_options) -> https_fn.Response:
+    resolved = resolve_object(key)
+    if resolved is None:
+        return https_fn.Response(status=404, response="File not found")
+    key, size = resolved
+
+    if size == 0:
         print(f"graph_generator empty file: {key}")
         return https_fn.Response(status=404, response="File not found")
+    if size > MAX_DECODE_BYTES:
+        return too_large_response(key, size)
+
+    weight = render_weight(size)
+    waited = admission.acquire(weight)
+    if waited is None:
+        log_metrics("render_shed", key=key, size=size)
+        return https_fn.Response(
+            status=503,
+            response="Too many renders in progress, retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    if waited:
+        log_metrics("render_queued", key=key, size=size, waitedSeconds=round(waited, 3))
+
+    try:
+        return download_graph(key, size, render_options)
+    finally:
+        admission.release(weight)
+
+
+def download_graph(key: str, size: int, render_options) -> https_fn.Response:
+    if size > SPILL_THRESHOLD_BYTES:
+        # Large objects go to disk so the decoders can memory-map them
+        suffix = os.path.splitext(key)[1]
+        with tempfile.NamedTemporaryFile(dir=SPILL_DIR, suffix=suffix) as spill_file:
+            s3.download_fileobj(Bucket=bucket, Key=key, Fileobj=spill_file)
+            spill_file.flush()
+            return decode_graph(spill_file.name, key, render_options)
+
+    # Download file data with buffer
+    object_buffer = io.BytesIO()
+    s3.download_fileobj(Bucket=bucket, Key=key, Fileobj=object_buffer)
     object_buffer.seek(0)
+    return decode_graph(object_buffer, key, render_options)
+
+
+def decode_graph(source, key: str, render_options) -> https_fn.Response:
+    estimate = estimate_decoded_bytes(source, key)
+    if estimate > MAX_DECODE_BYTES:
+        return too_large_response(key, estimate)
 
     if key.lower().endswith(".fits"):
-        return fits_graph(object_buffer, key)
+        return fits_graph(source, key, render_options)
 
     elif key.lower().endswith(".mat"):
-        return mat_graph(object_buffer, key)
+        return mat_graph(source, key, render_options)
 
     return https_fn.Response(status=404)
 
@@ -285,6 +834,11 @@ def get_years_stations(req: https_fn.Request) -> https_fn.Response:
     file_extension = normalize_extension(raw_extension)
     if raw_extension and not file_extension:
         return https_fn.Response(status=400, response="Invalid parameters")
+
+    validator = index_validator(req)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
     collection_ref = db.collection(YEARS_STATIONS_COLLECTION)
 
     if file_extension:
@@ -315,7 +869,7 @@ def get_years_stations(req: https_fn.Request) -> https_fn.Response:
     if len(response) == 0:
         return https_fn.Response(status=404, response="No data found")
 
-    return json_response(response)
+    return json_response(response, validator=validator)
 
 
 @https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["get"]))
@@ -345,6 +899,11 @@ def get_available_dates(req: https_fn.Request) -> https_fn.Response:
         or (raw_extension and not file_extension)
     ):
         return https_fn.Response(status=400, response="Invalid parameters")
+
+    validator = index_validator(req)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
     collection_ref = db.collection(AVAILABLE_DATES_COLLECTION)
     query = collection_ref.where("stationId", "==", station).where("year", "==", year)
 
@@ -356,24 +915,16 @@ def get_available_dates(req: https_fn.Request) -> https_fn.Response:
     if not docs:
         return https_fn.Response(status=404, response="No data found")
 
-    narrowband_set = set()
-    broadband_set = set()
+    narrowband_bits = 0
+    broadband_bits = 0
 
     for doc in docs:
         data = doc.to_dict()
-        for item in data.get("narrowband", []):
-            narrowband_set.add((item.get("month"), item.get("day")))
-        for item in data.get("broadband", []):
-            broadband_set.add((item.get("month"), item.get("day")))
-
-    narrowband = [
-        {"day": day, "month": month}
-        for month, day in sorted(narrowband_set)
-    ]
-    broadband = [
-        {"day": day, "month": month}
-        for month, day in sorted(broadband_set)
-    ]
+        narrowband_bits |= day_bits(data, "narrowband")
+        broadband_bits |= day_bits(data, "broadband")
+
+    narrowband = days_response(narrowband_bits)
+    broadband = days_response(broadband_bits)
 
     if len(broadband) == 0 and len(narrowband) == 0:
         return https_fn.Response(status=404, response="No data found")
@@ -382,7 +933,90 @@ def get_available_dates(req: https_fn.Request) -> https_fn.Response:
         {
             "narrowband": narrowband,
             "broadband": broadband,
-        }
+        },
+        validator=validator,
+    )
+
+
+@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["get"]))
+def get_coverage(req: https_fn.Request) -> https_fn.Response:
+    if not verify_request(req):
+        return https_fn.Response(status=401, response="Unauthorized")
+    # Days of a year where all (mode=all) or any (mode=any) of the given stations have data,
+    # plus the coverage of each station
+    # Args = year, example 2015, optional stations, example SA,PA,EA, type, fileEndsWith and mode
+    year = req.args.get("year")
+    raw_stations = req.args.get("stations")
+    raw_type = req.args.get("type")
+    file_type = normalize_type(raw_type)
+    raw_extension = req.args.get("fileEndsWith")
+    file_extension = normalize_extension(raw_extension)
+    mode = (req.args.get("mode") or "all").lower()
+
+    if not year:
+        return https_fn.Response(status=400, response="Year missing")
+
+    year = parse_int(year)
+    stations = [station for station in (raw_stations or "").split(",") if station]
+    if (
+        year is None
+        or year < MIN_YEAR
+        or year > MAX_YEAR
+        or not all(valid_station(station) for station in stations)
+        or (raw_type and not file_type)
+        or (raw_extension and not file_extension)
+        or mode not in ALLOWED_COVERAGE_MODES
+    ):
+        return https_fn.Response(status=400, response="Invalid parameters")
+
+    validator = index_validator(req)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
+    query = db.collection(AVAILABLE_DATES_COLLECTION).where("year", "==", year)
+    if file_extension:
+        query = query.where("extension", "==", file_extension)
+
+    types = [file_type] if file_type else sorted(ALLOWED_TYPES)
+    station_bits = {station: 0 for station in stations}
+    for doc in query.stream():
+        data = doc.to_dict()
+        station = data.get("stationId")
+        if stations and station not in station_bits:
+            continue
+        bits = station_bits.get(station, 0)
+        for data_type in types:
+            bits |= day_bits(data, data_type)
+        station_bits[station] = bits
+
+    if not any(station_bits.values()):
+        return https_fn.Response(status=404, response="No data found")
+
+    days_in_year = (datetime(year + 1, 1, 1) - datetime(year, 1, 1)).days
+    combined = None
+    for bits in station_bits.values():
+        if combined is None:
+            combined = bits
+        elif mode == "all":
+            combined &= bits
+        else:
+            combined |= bits
+
+    return json_response(
+        {
+            "year": year,
+            "mode": mode,
+            "days": days_response(combined),
+            "coverage": [
+                {
+                    "stationId": station,
+                    "days": bits.bit_count(),
+                    "percent": round(100 * bits.bit_count() / days_in_year, 2),
+                }
+                for station, bits in sorted(station_bits.items())
+            ],
+        },
+        validator=validator,
     )
 
 
@@ -400,6 +1034,7 @@ def get_available_files(req: https_fn.Request) -> https_fn.Response:
     file_type = normalize_type(raw_type)
     raw_extension = req.args.get("fileEndsWith")
     file_extension = normalize_extension(raw_extension)
+    response_format = normalize_format(req.args.get("format"))
 
     year = req.args.get("year")
     month = req.args.get("month")
@@ -423,6 +1058,7 @@ def get_available_files(req: https_fn.Request) -> https_fn.Response:
         or (station and not valid_station(station))
         or (raw_type and not file_type)
         or (raw_extension and not file_extension)
+        or not response_format
     ):
         return https_fn.Response(status=400, response="Invalid parameters")
 
@@ -430,6 +1066,10 @@ def get_available_files(req: https_fn.Request) -> https_fn.Response:
     if extension != "fits":
         extension = "mat"
 
+    validator = index_validator(req)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
     date_str = f"{year:04d}-{month:02d}-{day:02d}"
     collection_ref = db.collection(FILES_BY_DAY_COLLECTION)
 
@@ -472,7 +1112,10 @@ def get_available_files(req: https_fn.Request) -> https_fn.Response:
     if len(response) == 0:
         return https_fn.Response(status=404, response="No data found")
 
-    return json_response(response)
+    if response_format == "compact":
+        return json_response(compact_files(response), validator=validator)
+
+    return json_response(response, validator=validator)
 
 
 @https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["get"]))
@@ -488,6 +1131,7 @@ def get_matrix(req: https_fn.Request) -> https_fn.Response:
     file_type = normalize_type(raw_type)
     raw_extension = req.args.get("fileEndsWith")
     file_extension = normalize_extension(raw_extension)
+    response_format = normalize_format(req.args.get("format"))
 
     if not year:
         year = MIN_YEAR
@@ -501,6 +1145,7 @@ def get_matrix(req: https_fn.Request) -> https_fn.Response:
         or (station and not valid_station(station))
         or (raw_type and not file_type)
         or (raw_extension and not file_extension)
+        or not response_format
     ):
         return https_fn.Response(status=400, response="Invalid parameters")
 
@@ -508,6 +1153,10 @@ def get_matrix(req: https_fn.Request) -> https_fn.Response:
     if extension != "fits":
         extension = "mat"
 
+    validator = index_validator(req)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
     if not station and not file_type:
         doc_id = f"{extension}_{year}"
         doc = db.collection(MATRIX_COLLECTION).document(doc_id).get()
@@ -555,4 +1204,74 @@ def get_matrix(req: https_fn.Request) -> https_fn.Response:
     if len(response) == 0:
         return https_fn.Response(status=404, response="No data found")
 
-    return json_response(response)
+    if response_format == "compact":
+        return json_response(
+            compact_records(response, ["date", "stations", "count"]), validator=validator
+        )
+
+    return json_response(response, validator=validator)
+
+
+@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["get"]))
+def get_events(req: https_fn.Request) -> https_fn.Response:
+    if not verify_request(req):
+        return https_fn.Response(status=401, response="Unauthorized")
+    # Events written by event_detection.py, one per excursion of an amplitude or phase signal
+    # Args = station, example SA, year, example 2015, optional month, kind and fileEndsWith
+    station = req.args.get("station")
+    year = req.args.get("year")
+    month = req.args.get("month")
+    kind = req.args.get("kind")
+    raw_extension = req.args.get("fileEndsWith")
+    file_extension = normalize_extension(raw_extension)
+
+    if not station or not year:
+        return https_fn.Response(status=400, response="Station or year missing")
+
+    year = parse_int(year)
+    month = parse_int(month) if month else None
+    if (
+        year is None
+        or year < MIN_YEAR
+        or year > MAX_YEAR
+        or not valid_station(station)
+        or (req.args.get("month") and (month is None or not (1 <= month <= 12)))
+        or (kind and kind.lower() not in ALLOWED_EVENT_KINDS)
+        or (raw_extension and not file_extension)
+    ):
+        return https_fn.Response(status=400, response="Invalid parameters")
+
+    validator = index_validator(req, EVENTS_STATE_DOCUMENT)
+    if is_not_modified(req, validator):
+        return not_modified_response(validator)
+
+    query = (
+        db.collection(EVENTS_COLLECTION)
+        .where("stationId", "==", station)
+        .where("year", "==", year)
+    )
+    if file_extension:
+        query = query.where("extension", "==", file_extension)
+    if kind:
+        query = query.where("kind", "==", kind.lower())
+
+    response = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        if month and not data.get("date", "").startswith(f"{year:04d}-{month:02d}-"):
+            continue
+        response.append({field: serialize_datetime(value) for field, value in data.items()})
+
+    if len(response) == 0:
+        return https_fn.Response(status=404, response="No data found")
+
+    response.sort(key=lambda item: (item.get("start") or "", item.get("signal") or ""))
+    return json_response(response, validator=validator)
+
+
+@scheduler_fn.on_schedule(schedule="every 60 minutes", timeout_sec=540, memory=options.MemoryOption.GB_1)
+def reindex_files(event: scheduler_fn.ScheduledEvent) -> None:
+    # Incremental: only days with objects newer than the last checkpoint are rewritten.
+    # A full rescan does not fit in one invocation, so seeding is left to indexer.py --full
+    result = build_index(db, s3, bucket, require_checkpoint=True)
+    print(f"reindex_files: {result}")
@@ -7,14 +7,39 @@ import matplotlib.pyplot as plt
 from matplotlib import rcParams
 from matplotlib.dates import DateFormatter
 
+from plot_common import thumbnail_axes
 
-def plot_awesome(mat_contents0, fname):
+
+def load_awesome(source):
+    #
+    # decode awesome data (.mat) from a path or file-like object
+    # raises OSError when the file is corrupted or not in HDF5 format
+    #
+    import h5py
+    import scipy.io as sio
+    from mat73 import HDF5Decoder
+
+    try:
+        # Handles v4 (Level 1.0), v6 and v7 to 7.2
+        return sio.loadmat(source)
+    except (ValueError, NotImplementedError):
+        # Handles v7.3
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        decoder = HDF5Decoder()
+        with h5py.File(source) as hdf5:
+            return decoder.mat2dict(hdf5)["data"]
+
+
+def plot_awesome(mat_contents0, fname, figsize=None, decorations=True):
     #
     # plot awesome data (.mat)
     # depends on fname format,
     #   plot narrowband data amplitude (file ends at 'A')
     #   plot narrowband data phase (file ends at 'B')
     #   plot broadband data spectogram
+    # figsize overrides the default size, decorations=False draws a thumbnail
+    #   without title, legend, colorbar or axis labels and with few, small ticks
     #
     rcParams['figure.figsize'] = 7, 4
     rcParams['figure.autolayout'] = True
@@ -25,68 +50,21 @@ def plot_awesome(mat_contents0, fname):
     # -----------------------------------------------------------------------------
 
     if len(fname) == 26:  # é narrowband
-        channel_sampling_freq0 = mat_contents0['Fs']
-        data_amp = mat_contents0['data']
         callsign0 = fname[14:17]
         adc_channel0 = mat_contents0['adc_channel_number']
-        start_day0 = mat_contents0['start_day']
-        start_hour0 = mat_contents0['start_hour']
-        start_minute0 = mat_contents0['start_minute']
-        start_month0 = mat_contents0['start_month']
-        start_second0 = mat_contents0['start_second']
-        start_year0 = mat_contents0['start_year']
         station_name0 = mat_contents0['station_name']
-
-        startdate0 = dt.datetime(start_year0[0, 0], start_month0[0, 0], start_day0[0, 0], start_hour0[0, 0],
-                                 start_minute0[0, 0], start_second0[0, 0])
-
-        time0 = pd.date_range(str(startdate0), periods=len(data_amp),
-                              freq=str(channel_sampling_freq0)[2:3] + ' s')
-
-        # 'Type_ABCDF':       [21,21],
-        # A is low resolution (1 Hz sampling rate) amplitude
-        # B is low resolution (1 Hz sampling rate) phase
-        # C is high resolution (50 Hz sampling rate) amplitude
-        # D is high resolution (50 Hz sampling rate) phase
-        # F is high resolution (50 Hz sampling rate) effective group delay
+        startdate0 = awesome_start_date(mat_contents0)
 
         plot_AB = fname[21]
-        if (plot_AB != 'A') and (plot_AB != 'B'):  # por hora só suporte A e B (low frequency)
+        df0 = awesome_narrowband_frame(mat_contents0, fname)
+        if df0 is None:  # por hora só suporte A e B (low frequency)
             return_code = 500  # error
             return None, return_code
 
-        if plot_AB == 'A':  # amplitude
-            df0 = pd.DataFrame(data_amp, index=time0, columns=['amp'])
-
-        if plot_AB == 'B':  # phase
-
-            # correct phase...
-            # -------------------------------------------------------------------------
-            AveragingLengthAmp = 1  # dados a cada 10seg
-            AveragingLengthPhase = 1
-            PhaseFixLength = 60
-            averaging_length = channel_sampling_freq0 * PhaseFixLength
-
-            data_phase_fixed180 = fix_phasedata180(data_amp, averaging_length)
-            data_phase_fixed190 = fix_phasedata90(data_phase_fixed180, averaging_length)
-
-            offset = 0
-            data_phase_unwrapped = np.zeros(len(data_phase_fixed190))
-            data_phase_unwrapped[0] = data_phase_fixed190[0]
-
-            for jj in range(1, len(data_phase_fixed190)):
-                if data_phase_fixed190[jj] - data_phase_fixed190[jj - 1] > 180:
-                    offset = offset + 360
-                elif data_phase_fixed190[jj] - data_phase_fixed190[jj - 1] < -180:
-                    offset = offset - 360
-                data_phase_unwrapped[jj] = data_phase_fixed190[jj] - offset
-
-            df0 = pd.DataFrame(data_phase_unwrapped, index=time0, columns=['phase'])
-
         df0_integrated = df0.resample('10 s').mean()  # dado de amplitude a cada 10 segundos
 
         try:
-            fig, (ax0) = plt.subplots(1)  # , sharex=True, sharey=False
+            fig, (ax0) = plt.subplots(1, figsize=figsize)  # , sharex=True, sharey=False
 
             if plot_AB == 'A':
                 ax0.plot(df0_integrated, 'b:', lw=2, alpha=0.4, label='10s sampling')
@@ -115,11 +93,14 @@ def plot_awesome(mat_contents0, fname):
             else:
                 ch = ''
 
-            ax0.set_title(
-                ''.join(map(lambda num: chr(num[0]), station_name0)) + ' ' + str(startdate0)[0:10] + ' ' + str(
-                    callsign0) + ' ' + sub_title + ', ' + ch + ' Antenna', weight='bold')
+            if decorations:
+                ax0.set_title(
+                    ''.join(map(lambda num: chr(num[0]), station_name0)) + ' ' + str(startdate0)[0:10] + ' ' + str(
+                        callsign0) + ' ' + sub_title + ', ' + ch + ' Antenna', weight='bold')
 
-            plt.legend(fontsize=8)
+                plt.legend(fontsize=8)
+            else:
+                thumbnail_axes(ax0)
 
             plt.show()
 
@@ -159,22 +140,26 @@ def plot_awesome(mat_contents0, fname):
 
         try:
             rcParams['figure.figsize'] = 7.5, 4.5
-            fig, (ax0) = plt.subplots(1)  # , sharex=True, sharey=False
+            fig, (ax0) = plt.subplots(1, figsize=figsize)  # , sharex=True, sharey=False
 
             # Plot the spectrogram
             ax0.specgram(df0.amp, Fs=94000)
 
-            pcm = ax0.pcolormesh(np.random.random((20, 20)), cmap='viridis')
+            if decorations:
+                pcm = ax0.pcolormesh(np.random.random((20, 20)), cmap='viridis')
 
-            fig.colorbar(pcm, label='Intensity (dB)', ax=ax0)
+                fig.colorbar(pcm, label='Intensity (dB)', ax=ax0)
             ax0.set_xlabel('Time (s)')
             ax0.set_ylabel('Frequency (Hz)')
 
             sub_title = 'Spectogram'
             ch = ''
-            ax0.set_title(
-                ''.join(map(lambda num: chr(num[0]), station_name0)) + ' ' + str(startdate0)[0:10] + ' ' + str(
-                    callsign0) + ' ' + sub_title + ', ' + ch + ' Antenna', weight='bold')
+            if decorations:
+                ax0.set_title(
+                    ''.join(map(lambda num: chr(num[0]), station_name0)) + ' ' + str(startdate0)[0:10] + ' ' + str(
+                        callsign0) + ' ' + sub_title + ', ' + ch + ' Antenna', weight='bold')
+            else:
+                thumbnail_axes(ax0, date_axis=False)
 
             plt.show()
 
@@ -186,6 +171,68 @@ def plot_awesome(mat_contents0, fname):
         return fig, return_code
 
 
+def awesome_start_date(mat_contents0):
+    return dt.datetime(mat_contents0['start_year'][0, 0], mat_contents0['start_month'][0, 0],
+                       mat_contents0['start_day'][0, 0], mat_contents0['start_hour'][0, 0],
+                       mat_contents0['start_minute'][0, 0], mat_contents0['start_second'][0, 0])
+
+
+def awesome_narrowband_frame(mat_contents0, fname):
+    #
+    # return narrowband awesome data (.mat) as a DataFrame at the file sampling rate,
+    #   column 'amp' for amplitude files (ending at 'A')
+    #   column 'phase', corrected and unwrapped, for phase files (ending at 'B')
+    # or None for the other types
+    #
+    channel_sampling_freq0 = mat_contents0['Fs']
+    data_amp = mat_contents0['data']
+    startdate0 = awesome_start_date(mat_contents0)
+
+    time0 = pd.date_range(str(startdate0), periods=len(data_amp),
+                          freq=str(channel_sampling_freq0)[2:3] + ' s')
+
+    # 'Type_ABCDF':       [21,21],
+    # A is low resolution (1 Hz sampling rate) amplitude
+    # B is low resolution (1 Hz sampling rate) phase
+    # C is high resolution (50 Hz sampling rate) amplitude
+    # D is high resolution (50 Hz sampling rate) phase
+    # F is high resolution (50 Hz sampling rate) effective group delay
+
+    plot_AB = fname[21]
+    if (plot_AB != 'A') and (plot_AB != 'B'):  # por hora só suporte A e B (low frequency)
+        return None
+
+    if plot_AB == 'A':  # amplitude
+        df0 = pd.DataFrame(data_amp, index=time0, columns=['amp'])
+
+    if plot_AB == 'B':  # phase
+
+        # correct phase...
+        # -------------------------------------------------------------------------
+        AveragingLengthAmp = 1  # dados a cada 10seg
+        AveragingLengthPhase = 1
+        PhaseFixLength = 60
+        averaging_length = channel_sampling_freq0 * PhaseFixLength
+
+        data_phase_fixed180 = fix_phasedata180(data_amp, averaging_length)
+        data_phase_fixed190 = fix_phasedata90(data_phase_fixed180, averaging_length)
+
+        offset = 0
+        data_phase_unwrapped = np.zeros(len(data_phase_fixed190))
+        data_phase_unwrapped[0] = data_phase_fixed190[0]
+
+        for jj in range(1, len(data_phase_fixed190)):
+            if data_phase_fixed190[jj] - data_phase_fixed190[jj - 1] > 180:
+                offset = offset + 360
+            elif data_phase_fixed190[jj] - data_phase_fixed190[jj - 1] < -180:
+                offset = offset - 360
+            data_phase_unwrapped[jj] = data_phase_fixed190[jj] - offset
+
+        df0 = pd.DataFrame(data_phase_unwrapped, index=time0, columns=['phase'])
+
+    return df0
+
+
 def fix_phasedata180(data_phase, averaging_length):
     #
     # return fix phase data 180 ONLY AWESOME data
@@ -0,0 +1,20 @@
+from matplotlib.dates import AutoDateLocator
+from matplotlib.ticker import MaxNLocator
+
+
+THUMBNAIL_TICK_LABELSIZE = 7
+THUMBNAIL_MAX_TICKS = 3
+
+
+def thumbnail_axes(ax, date_axis=True):
+    # strip an axis down to what stays legible at thumbnail size:
+    # no axis labels or minor ticks, small tick labels and at most a few major ticks
+    ax.set_xlabel('')
+    ax.set_ylabel('')
+    ax.minorticks_off()
+    ax.tick_params(labelsize=THUMBNAIL_TICK_LABELSIZE)
+    if date_axis:
+        ax.xaxis.set_major_locator(AutoDateLocator(minticks=2, maxticks=THUMBNAIL_MAX_TICKS))
+    else:
+        ax.xaxis.set_major_locator(MaxNLocator(THUMBNAIL_MAX_TICKS))
+    ax.yaxis.set_major_locator(MaxNLocator(THUMBNAIL_MAX_TICKS))
@@ -1,19 +1,64 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 from matplotlib import rcParams
 from matplotlib.dates import DateFormatter
 
+from plot_common import thumbnail_axes
 
-def plot_savnet(mat_contents0, fname):
-    fx = mat_contents0
+
+RESAMPLE_CHUNK_ROWS = 36000  # 10 hours of 1 s samples, a whole number of minutes
+
+
+def resample_minutes(data, start, columns, chunk_rows=RESAMPLE_CHUNK_ROWS):
+    # 60 s means of 1 s samples, built from minute-aligned chunks so memory-mapped
+    # data is never copied whole
+    start = pd.Timestamp(start)
+    offset = int((start - start.floor('min')).total_seconds())
+    boundaries = list(range((60 - offset) % 60, len(data), chunk_rows))
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    boundaries.append(len(data))
+
+    frames = []
+    for begin, end in zip(boundaries[:-1], boundaries[1:]):
+        # FITS data is big-endian; pandas needs native byte order
+        # https://github.com/astropy/astropy/issues/1156
+        chunk = np.asarray(data[begin:end])
+        chunk = chunk.astype(chunk.dtype.newbyteorder('='))
+        index = pd.date_range(start + pd.Timedelta(seconds=begin), periods=end - begin, freq='s')
+        frames.append(pd.DataFrame(chunk, columns=columns, index=index).resample('60 s').mean())
+    return pd.concat(frames)
+
+
+def savnet_frame(fx):
+    # 60 s averaged SAVNET data (.fits) with its column names and source header values
     header = []
     for a in fx[0].header.values():
         header.append(str(a))
     source = header[0:8]
     header = header[8::]
 
-    fig, ax = plt.subplots(1, 2, figsize=(16, 5))
+    data = fx[0].data
+    columns_count = data.shape[1] if data.ndim > 1 else 1
+    if len(header) != columns_count:
+        if len(header) < columns_count:
+            header = header + [
+                f"col_{index}" for index in range(len(header), columns_count)
+            ]
+        else:
+            header = header[:columns_count]
+    df = resample_minutes(data, fx[0].header["DATE-OBS"], header)
+    return df, header, source
+
+
+def plot_savnet(mat_contents0, fname, figsize=None, decorations=True):
+    # figsize overrides the 16x5 default, decorations=False draws a thumbnail
+    # without titles, legends or axis labels and with few, small ticks
+    fx = mat_contents0
+
+    fig, ax = plt.subplots(1, 2, figsize=figsize or (16, 5))
 
     try:
         rcParams['figure.figsize'] = 16, 5
@@ -21,27 +66,7 @@ def plot_savnet(mat_contents0, fname):
         rcParams['font.size'] = 10
         rcParams['xtick.labelsize'] = 10
 
-        t = pd.date_range(
-            fx[0].header["DATE-OBS"],
-            periods=fx[0].header["NAXIS2"],
-            freq="s",
-        )
-        data = fx[0].data.byteswap().newbyteorder()
-        columns_count = data.shape[1] if data.ndim > 1 else 1
-        if len(header) != columns_count:
-            if len(header) < columns_count:
-                header = header + [
-                    f"col_{index}" for index in range(len(header), columns_count)
-                ]
-            else:
-                header = header[:columns_count]
-        df = pd.DataFrame(
-            data,
-            columns=header,
-            index=t,
-        )  # https://github.com/astropy/astropy/issues/1156
-
-        df = df.resample('60 s').mean()
+        df, header, source = savnet_frame(fx)
 
         for name in [x for x in header if 'Amp' in x]:
             ax[0].plot(df[name], label=name, lw=1, alpha=0.9)
@@ -49,8 +74,6 @@ def plot_savnet(mat_contents0, fname):
         for name in [x for x in header if 'Phase' in x]:
             ax[1].plot(df[name], label=name, lw=1, alpha=0.9)
 
-        ax[0].set_title(source[-1].upper() + ' - ' + source[-2] + ' - Amplitude', weight='bold', fontsize=16)
-        ax[1].set_title(source[-1].upper() + ' - ' + source[-2] + ' - Phase', weight='bold', fontsize=16)
         ax[0].set_xlabel(header[0] + ' [sample 60s]', fontsize=12)
         ax[1].set_xlabel(header[0] + ' [sample 60s]', fontsize=12)
         ax[0].set_ylabel('Averaged Amplitude [dB]', fontsize=12)
@@ -59,8 +82,14 @@ def plot_savnet(mat_contents0, fname):
         ax[0].xaxis.set_major_formatter(DateFormatter('%H:%M'))
         ax[1].xaxis.set_major_formatter(DateFormatter('%H:%M'))
 
-        ax[0].legend(loc='best', fontsize=9)
-        ax[1].legend(loc='best', fontsize=9)
+        if decorations:
+            ax[0].set_title(source[-1].upper() + ' - ' + source[-2] + ' - Amplitude', weight='bold', fontsize=16)
+            ax[1].set_title(source[-1].upper() + ' - ' + source[-2] + ' - Phase', weight='bold', fontsize=16)
+            ax[0].legend(loc='best', fontsize=9)
+            ax[1].legend(loc='best', fontsize=9)
+        else:
+            thumbnail_axes(ax[0])
+            thumbnail_axes(ax[1])
         ax[0].grid()
         ax[1].grid()
 
@@ -0,0 +1,18 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def main():
+    # main creates Firebase, Firestore and S3 clients at import time
+    with mock.patch("firebase_admin.initialize_app"), mock.patch(
+        "google.auth.default", return_value=(mock.Mock(), "test-project")
+    ), mock.patch("google.cloud.firestore.Client"), mock.patch("boto3.client"):
+        import main
+
+        yield main
@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+def test_full_queue_sheds_without_waiting(main):
+    admission = main.AdmissionController(1, 100, 1, 5)
+    assert admission.acquire(10) == 0.0
+
+    queued = threading.Thread(target=admission.acquire, args=(10,))
+    queued.start()
+    while admission.snapshot()["queueDepth"] == 0:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    assert admission.acquire(10) is None
+    assert time.monotonic() - started < 1
+
+    admission.release(10)
+    queued.join()
+    assert admission.snapshot()["shed"] == 1
+
+
+def test_default_queue_fits_in_instance_concurrency(main):
+    assert main.RENDER_QUEUE_SIZE < main.GRAPH_CONCURRENCY - main.RENDER_MAX_INFLIGHT
+
+
+def test_render_weight_counts_in_memory_spill_file(main, monkeypatch):
+    monkeypatch.setattr(main, "SPILL_THRESHOLD_BYTES", 100)
+    monkeypatch.setattr(main, "RENDER_MEMORY_BUDGET_BYTES", 10_000)
+
+    assert main.render_weight(100) == 100 * main.DECODE_OVERHEAD
+    assert main.render_weight(200) == 200 * (main.DECODE_OVERHEAD + 1)
+
+    monkeypatch.setattr(main, "SPILL_DIR", "/mnt/spill")
+    assert main.render_weight(200) == 200 * main.DECODE_OVERHEAD
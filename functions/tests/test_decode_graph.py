@@ -0,0 +1,51 @@
+import io
+
+import numpy as np
+from astropy.io import fits
+
+
+def savnet_buffer(rows=600):
+    hdu = fits.PrimaryHDU(np.random.random((rows, 3)).astype(">f4"))
+    hdu.header["DATE-OBS"] = "2015-01-01T00:00:00"
+    hdu.header["STATION"] = "SA"
+    hdu.header["COL1"] = "Time"
+    hdu.header["COL2"] = "Amp NPM"
+    hdu.header["COL3"] = "Phase NPM"
+    buffer = io.BytesIO()
+    hdu.writeto(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_estimate_fits_bytes_keeps_buffer_open(main):
+    buffer = savnet_buffer()
+
+    assert main.estimate_fits_bytes(buffer) == 600 * 3 * 4
+    assert not buffer.closed
+    assert buffer.tell() == 0
+
+
+def test_decode_graph_renders_in_memory_fits(main):
+    path = "2015/01/01/narrowband/SA/SA150101.fits"
+    render_options = main.RENDER_PRESETS["default"]
+
+    response = main.decode_graph(savnet_buffer(), path, render_options)
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).startswith("data:image/png;base64,")
+
+
+def test_savnet_thumbnail_drops_labels_and_caps_ticks():
+    import matplotlib.pyplot as plt
+    from plot_savnet import plot_savnet
+
+    with fits.open(savnet_buffer(rows=6 * 3600)) as fx:
+        fig, rc = plot_savnet(fx, "SA150101.fits", figsize=(4, 2.5), decorations=False)
+
+    assert rc == 0
+    fig.canvas.draw()
+    for ax in fig.axes:
+        assert ax.get_xlabel() == ax.get_ylabel() == ""
+        for ticks, (low, high) in ((ax.get_xticks(), ax.get_xlim()), (ax.get_yticks(), ax.get_ylim())):
+            assert 0 < len([tick for tick in ticks if low <= tick <= high]) <= 4
+    plt.close(fig)
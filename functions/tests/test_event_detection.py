@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from event_detection import detect_series
+
+
+def file_part(name, start, minutes, rng):
+    index = pd.date_range(start, periods=minutes, freq="60 s")
+    series = pd.DataFrame({"amp": 30 + rng.normal(0, 0.1, minutes)}, index=index)
+    return {"fileName": name}, series
+
+
+def test_detect_series_flags_event_at_start_of_next_file():
+    rng = np.random.default_rng(0)
+    first = file_part("first", "2006-04-06 12:00", 90, rng)
+    second = file_part("second", "2006-04-06 13:30", 90, rng)
+    # Inside the first baseline_minutes // 2 of the second file, unscorable on its own
+    second[1].iloc[10:15] += 5
+
+    events = detect_series([second, first])
+
+    assert [(event["fileName"], event["start"].strftime("%H:%M")) for event in events] == [
+        ("second", "13:40")
+    ]
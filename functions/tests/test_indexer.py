@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import indexer
+
+
+BUCKET = "craam-files-bucket"
+CHECKPOINT = datetime(2024, 5, 2, 12, tzinfo=timezone.utc)
+
+
+def test_changed_groups_rebuilds_day_of_late_listed_object():
+    # Listed only after the checkpoint run, with a LastModified from before it
+    objects = [
+        ("2024/05/01/narrowband/SA/SA240501.fits", CHECKPOINT - timedelta(days=1)),
+        ("2024/05/02/narrowband/SA/SA240502.fits", CHECKPOINT - timedelta(hours=1)),
+    ]
+
+    groups = indexer.changed_groups(objects, BUCKET, CHECKPOINT)
+
+    assert [group["date"] for group in groups.values()] == ["2024-05-02"]
+
+
+def test_changed_groups_without_checkpoint_keeps_every_day():
+    objects = [
+        ("2024/05/01/narrowband/SA/SA240501.fits", CHECKPOINT - timedelta(days=1)),
+        ("2024/05/02/narrowband/SA/SA240502.fits", CHECKPOINT - timedelta(days=2)),
+    ]
+
+    assert len(indexer.changed_groups(objects, BUCKET)) == 2
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def get(self):
+        return FakeSnapshot(self.store.get(self.path))
+
+    def set(self, data):
+        self.store[self.path] = data
+
+
+class FakeCollection:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self.store, (self.name, doc_id))
+
+
+class FakeBatch:
+    def set(self, ref, data):
+        ref.set(data)
+
+    def delete(self, ref):
+        ref.store.pop(ref.path, None)
+
+    def commit(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self, store):
+        self.store = store
+
+    def collection(self, name):
+        return FakeCollection(self.store, name)
+
+    def batch(self):
+        return FakeBatch()
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix="", Delimiter=None):
+        if Delimiter:
+            prefixes = sorted({key.split("/")[0] + "/" for key, _ in self.objects})
+            return [{"CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes]}]
+        contents = [
+            {"Key": key, "LastModified": last_modified}
+            for key, last_modified in self.objects
+            if key.startswith(Prefix)
+        ]
+        return [{"Contents": contents}]
+
+
+@pytest.mark.parametrize(
+    "key, expected",
+    [
+        (
+            "2006/04/06/narrowband/B1/B1060406134536NPM_003A.mat",
+            {"transmitter": "NPM", "CC": "03", "typeABCDF": "A",
+             "dateTime": datetime(2006, 4, 6, 13, 45, 36, tzinfo=timezone.utc)},
+        ),
+        (
+            "2006/04/06/broadband/B1/BB060406134500_003.mat",
+            {"transmitter": None, "CC": "03", "typeABCDF": None,
+             "dateTime": datetime(2006, 4, 6, 13, 45, tzinfo=timezone.utc)},
+        ),
+    ],
+)
+def test_parse_key_awesome_names(key, expected):
+    entry = indexer.parse_key(key, BUCKET)
+
+    assert entry["date"] == "2006-04-06"
+    assert entry["stationId"] == "B1"
+    assert entry["extension"] == "mat"
+    assert {field: entry["item"][field] for field in expected} == expected
+
+
+def test_parse_key_savnet_20_prefix():
+    entry = indexer.parse_key("202015/01/01/narrowband/SA/SA150101.fits", BUCKET)
+
+    assert (entry["year"], entry["date"], entry["extension"]) == (2015, "2015-01-01", "fits")
+
+
+@pytest.mark.parametrize(
+    "key",
+    [
+        "2015/02/30/narrowband/SA/SA150230.fits",
+        "2015/13/01/narrowband/SA/SA151301.fits",
+        "2015/01/01/narrowband/SA/SA150101.txt",
+        "2015/01/01/other/SA/SA150101.fits",
+    ],
+)
+def test_parse_key_rejects_invalid_keys(key):
+    assert indexer.parse_key(key, BUCKET) is None
+
+
+def test_incremental_build_merges_changed_days_into_existing_documents():
+    store = {
+        ("index_state", "files"): {"lastModified": CHECKPOINT},
+        ("available_dates", "SA_2024_fits"): {
+            "stationId": "SA",
+            "year": 2024,
+            "extension": "fits",
+            "narrowband": [{"month": 4, "day": 30}],
+            "broadband": [],
+        },
+        ("years_stations", "fits_2024"): {"year": 2024, "extension": "fits", "stations": ["SA"]},
+        ("matrix", "fits_2024"): {
+            "extension": "fits",
+            "year": 2024,
+            "items": [{"date": "2024-04-30", "stations": ["SA"], "count": 1}],
+        },
+    }
+    s3 = FakeS3(
+        [
+            ("2024/04/30/narrowband/SA/SA240430.fits", CHECKPOINT - timedelta(days=1)),
+            ("2024/05/02/narrowband/SA/SA240502.fits", CHECKPOINT + timedelta(hours=1)),
+            ("2024/05/02/narrowband/PA/PA240502.fits", CHECKPOINT + timedelta(hours=1)),
+        ]
+    )
+
+    result = indexer.build_index(FakeDb(store), s3, BUCKET, workers=1)
+
+    assert result == {"objects": 3, "days": 2}  # both stations of 2024-05-02
+    assert ("files_by_day", "2024-04-30_SA_narrowband_fits") not in store
+    assert ("files_by_day", "2024-05-02_SA_narrowband_fits") in store
+
+    dates = store[("available_dates", "SA_2024_fits")]
+    assert dates["narrowband"] == [{"month": 4, "day": 30}, {"month": 5, "day": 2}]
+    assert indexer.bits_to_days(indexer.bits_from_bytes(dates["narrowbandBits"])) == [(4, 30), (5, 2)]
+    assert store[("years_stations", "fits_2024")]["stations"] == ["PA", "SA"]
+    assert store[("matrix", "fits_2024")]["items"] == [
+        {"date": "2024-04-30", "stations": ["SA"], "count": 1},
+        {"date": "2024-05-02", "stations": ["PA", "SA"], "count": 2},
+    ]
+    assert store[("index_state", "files")]["lastModified"] > CHECKPOINT
+
+
+def test_bitset_round_trip_includes_leap_day():
+    days = [(1, 1), (2, 28), (2, 29), (3, 1), (12, 31)]
+
+    bits = indexer.days_to_bits(days)
+    value = indexer.bits_to_bytes(bits)
+
+    assert len(value) == indexer.BITSET_BYTES
+    assert indexer.bits_to_days(indexer.bits_from_bytes(value)) == days
+    assert indexer.day_index(2, 29) == 59
+    assert indexer.day_index(12, 31) == 365
+
+
+def test_days_to_bits_skips_invalid_days():
+    assert indexer.bits_to_days(indexer.days_to_bits([(2, 30), (None, 1), (5, 2)])) == [(5, 2)]